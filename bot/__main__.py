@@ -2,15 +2,19 @@ import argparse
 import asyncio
 import logging
 import sys
+from collections.abc import Awaitable, Callable
+from typing import Any
 
-from sqlalchemy.ext.asyncio import async_sessionmaker
-from sqlalchemy.ext.asyncio.session import AsyncSession
 from telethon import TelegramClient
 
-from bot.background_jobs import handle_updates_for_entities
+try:
+    import uvloop
+except ImportError:  # uvloop недоступен на Windows
+    uvloop = None
+
+from bot.background_jobs import handle_updates_for_entities, register_update_handlers
 from bot.db.base import create_db_session_pool
 from bot.db.func import RedisStorage
-from bot.scheduler import Scheduler
 from bot.settings import se
 
 # Создаём объект парсера аргументов
@@ -26,26 +30,18 @@ bot_api_id: int = int(args.api_id)
 bot_api_hash: str = args.api_hash
 
 
-scheduler = Scheduler()
-
-
-async def run_scheduler() -> None:
+async def _periodic(
+    fn: Callable[..., Awaitable[Any]],
+    interval: int,
+    *args: Any,
+) -> None:
+    """Запускает fn(*args) раз в interval секунд, не прерываясь на ошибках."""
     while True:
-        await scheduler.run_pending()
-        await asyncio.sleep(1)
-
-
-async def set_tasks(
-    client: TelegramClient,
-    sessionmaker: async_sessionmaker[AsyncSession],
-    storage: RedisStorage,
-):
-    scheduler.every(10).seconds.do(
-        handle_updates_for_entities,
-        client,
-        sessionmaker,
-        storage,
-    )
+        try:
+            await fn(*args)
+        except Exception as e:
+            logger.exception(f"Ошибка в фоновой задаче {fn.__name__}: {e}")
+        await asyncio.sleep(interval)
 
 
 async def init_telethon_client() -> TelegramClient | None:
@@ -80,19 +76,21 @@ async def main() -> None:
 
     storage = RedisStorage(redis=redis, client_hash=bot_api_hash)
 
-    await set_tasks(client, sessionmaker, storage)
-
-    # Запуск планировщика и клиента
+    # Запуск клиента и фоновой задачи
+    task: asyncio.Task[None] | None = None
     try:
-        logger.info("Запуск планировщика и клиента")
-        await asyncio.gather(
-            client.start(),  # pyright: ignore
-            run_scheduler(),
+        logger.info("Запуск клиента и фоновой задачи")
+        await client.start()  # pyright: ignore
+        register_update_handlers(client, storage)
+        task = asyncio.create_task(
+            _periodic(handle_updates_for_entities, 10, client, sessionmaker, storage)
         )
         await client.run_until_disconnected()  # pyright: ignore
     except Exception as e:
         logger.exception(f"Ошибка при запуске Клиента: {e}")
     finally:
+        if task:
+            task.cancel()
         await client.disconnect()  # pyright: ignore
         logger.info("Клиент отключен")
 
@@ -100,7 +98,6 @@ async def main() -> None:
 if __name__ == "__main__":
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
-    logging.getLogger("schedule").setLevel(logging.WARNING)
 
     # Формат логов
     f = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
@@ -110,4 +107,6 @@ if __name__ == "__main__":
     console_handler.setFormatter(f)
     logger.addHandler(console_handler)
 
-    asyncio.run(main())
+    # uvloop быстрее стандартного цикла событий на сетевой нагрузке
+    loop_factory = uvloop.new_event_loop if uvloop else None
+    asyncio.run(main(), loop_factory=loop_factory)
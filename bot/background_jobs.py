@@ -1,10 +1,14 @@
+import asyncio
 import logging
+import time
 from typing import Final, cast
 
 from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
-from telethon import TelegramClient
+from telethon import TelegramClient, events
 from telethon.tl.types import Message
+from telethon.utils import get_peer_id
 
 from bot.db.func import RedisStorage
 from bot.db.models import MonitoringChannel, Post
@@ -13,10 +17,50 @@ from bot.utils import TypeChatLike, fn
 logger = logging.getLogger(__name__)
 minute: Final[int] = 60
 
+# Сколько каналов обрабатываем одновременно
+CHANNELS_CONCURRENCY: Final[int] = 8
+# Сколько каналов читаем из БД за один раз
+CHANNELS_CHUNK_SIZE: Final[int] = 200
+# Канал без push-событий всё равно опрашиваем не реже этого интервала
+FULL_SYNC_INTERVAL: Final[int] = 5 * minute
+
+# peer_id (как в event.chat_id) -> username из MonitoringChannel
+_peer_usernames: dict[int, str] = {}
+# username -> время начала последнего успешного опроса Telegram
+_last_synced: dict[str, float] = {}
+# username -> время последнего push-события (в этом процессе)
+_last_event: dict[str, float] = {}
+
 
 logger = logging.getLogger(__name__)
 
 
+def register_update_handlers(client: TelegramClient, storage: RedisStorage) -> None:
+    """
+    Подписка на push-обновления Telegram: новое сообщение в отслеживаемом
+    канале ставит флаг dirty:{username}, и канал опрашивается на ближайшем тике.
+    """
+
+    async def mark_dirty(event: events.NewMessage.Event) -> None:
+        username = _peer_usernames.get(event.chat_id)  # pyright: ignore
+        if username:
+            _last_event[username] = time.monotonic()
+            await storage.set_int(f"dirty:{username}", 1)
+
+    client.add_event_handler(mark_dirty, events.NewMessage())
+
+
+def _needs_sync(username: str, state: dict[str, int | None]) -> bool:
+    """Опрашиваем канал, если по нему пришло событие или давно не опрашивали."""
+    last_synced = _last_synced.get(username)
+    if last_synced is None or time.monotonic() - last_synced >= FULL_SYNC_INTERVAL:
+        return True
+    # Событие во время опроса: флаг в Redis к концу тика уже снят, но время новее
+    if _last_event.get(username, 0) >= last_synced:
+        return True
+    return bool(state.get(f"dirty:{username}"))
+
+
 async def handle_updates_for_entities(
     client: TelegramClient,
     sessionmaker: async_sessionmaker[AsyncSession],
@@ -25,122 +69,235 @@ async def handle_updates_for_entities(
     """
     Унифицированная обработка обновлений для каналов и чатов.
     Автоматически определяет тип сущности и использует соответствующий механизм синхронизации.
+    Каналы читаются из БД порциями по CHANNELS_CHUNK_SIZE, внутри порции
+    обрабатываются параллельно, не более CHANNELS_CONCURRENCY одновременно.
     """
-    async with sessionmaker() as session:
-        channels: list[MonitoringChannel] = await fn.get_channels(session)
+    # Новые PTS/max_id копятся здесь и записываются одним pipeline в конце
+    pending_writes: dict[str, int] = {}
+    semaphore = asyncio.Semaphore(CHANNELS_CONCURRENCY)
+    total = 0
 
-        if not channels:
-            logger.info("Нет сущностей для обработки.")
-            return
+    async def guarded(channel: MonitoringChannel, state: dict[str, int | None]) -> None:
+        async with semaphore:
+            await _process_channel(
+                channel, client, storage, sessionmaker, state, pending_writes
+            )
 
-        for channel in channels:
-            try:
-                if channel.username.startswith("@") or channel.username.startswith("-"):
-                    subscribed = await fn.Sub.subscribe_to_channel(
-                        channel.username,
-                        client,
-                        storage,
-                    )
-                else:
-                    subscribed = await fn.Sub.subscribe_by_invite_hash(
-                        channel.username,
-                        client,
-                        storage,
-                    )
-                    new_username = await fn.Sub.fetch_id_from_chat_invite_request(
-                        channel.username,
-                        client,
-                    )
-                    if new_username:
-                        channel.username = new_username
-                    else:
-                        logger.info(
-                            "Не удалось получить id канала, помечаю канал для удаления"
-                        )
-                        await session.delete(channel)
-                        continue
-
-                if not subscribed:
-                    logger.info(
-                        f"Не удалось подписаться/присоединиться к {channel.username}"
-                    )
-                    continue
-
-                entity = await fn.safe_get_entity(client, channel.username)
-                if not entity:
-                    logger.info(f"Сущность не найдена: {channel.username}")
-                    continue
-
-                # Приводим к Union-типу
-                chat_like: TypeChatLike = cast(TypeChatLike, entity)
-
-                # обновлеяем имя канала/чата если у него оно не указано еще
-                if not channel.title:
-                    channel.title = chat_like.title
-
-                # Определяем тип сущности
-                is_channel = getattr(chat_like, "broadcast", False)
-                is_megagroup = getattr(chat_like, "megagroup", False)
-
-                # Выбираем стратегию обработки
-                if is_channel and not is_megagroup:
-                    # Это обычный канал (broadcast)
-                    updates = await fn.get_difference_update_channel(
-                        client=client,
-                        storage=storage,
-                        channel=chat_like,
-                        channel_username=channel.username,
-                    )
-                else:
-                    # Это чат, супергруппа или мигрированная группа
-                    updates = await fn.get_difference_update_chat(
-                        client=client,
-                        storage=storage,
-                        chat=chat_like,
-                        chat_username=channel.username,
-                    )
+    try:
+        async for channels in fn.iter_channels(sessionmaker, CHANNELS_CHUNK_SIZE):
+            total += len(channels)
 
-                if not updates:
-                    logger.info(f"Нет новых сообщений в {channel.username}")
-                    continue
-
-                # Обработка новых сообщений
-                new_posts = []
-                for update in updates:
-                    if not isinstance(update, Message):
-                        continue
-
-                    msg_text = update.message or ""
-                    if not msg_text.strip():
-                        continue
-
-                    # Проверка на дубликат
-                    exists = await session.scalar(
-                        select(Post).where(
-                            (Post.message_id == update.id)
-                            & (Post.channel_username == channel.username)
-                        )
-                    )
-                    if exists:
-                        continue
+            # Состояние (PTS, max_id, флаги событий) порции одним MGET
+            keys = [
+                key for channel in channels for key in fn.state_keys(channel.username)
+            ]
+            state = dict(zip(keys, await storage.mget_int(keys)))
 
-                    post = Post(
-                        message_id=update.id,
-                        channel_username=channel.username,
-                        content=msg_text,
+            # После отката в сессии канала объект может быть просрочен,
+            # поэтому имена для лога берём заранее
+            usernames = [channel.username for channel in channels]
+            results = await asyncio.gather(
+                *(guarded(channel, state) for channel in channels),
+                return_exceptions=True,
+            )
+            for username, result in zip(usernames, results):
+                if isinstance(result, BaseException):
+                    logger.error(
+                        f"Необработанная ошибка канала {username}: {result!r}",
+                        exc_info=result,
                     )
-                    new_posts.append(post)
+    finally:
+        await storage.mset_int(pending_writes)
 
-                if new_posts:
-                    session.add_all(new_posts)
-                    logger.info(
-                        f"Сохранено {len(new_posts)} новых сообщений из {channel.username}"
-                    )
-                else:
-                    logger.info(f"Новых уникальных сообщений в {channel.username} нет.")
-
-            except Exception as e:
-                logger.info(f"Ошибка при обработке сущности {channel.username}: {e}")
-                # Не останавливаем обработку других сущностей
-                continue
-        await session.commit()
+    if not total:
+        logger.info("Нет сущностей для обработки.")
+
+
+async def _process_channel(
+    channel: MonitoringChannel,
+    client: TelegramClient,
+    storage: RedisStorage,
+    sessionmaker: async_sessionmaker[AsyncSession],
+    state: dict[str, int | None],
+    pending_writes: dict[str, int],
+) -> None:
+    """
+    Обработка одного канала в собственной сессии БД.
+    При ошибке откатываются и посты, и новые PTS/max_id только этого канала,
+    чтобы на следующем тике сообщения были запрошены повторно.
+    """
+    channel_writes: dict[str, int] = {}
+    # После rollback объект канала просрочен и в except его читать нельзя
+    username = channel.username
+    async with sessionmaker() as session:
+        session.add(channel)
+        try:
+            synced = await _sync_channel(
+                channel, client, storage, session, state, channel_writes
+            )
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            # Сущность (и InputChannel) могли устареть — перезапросим на следующем тике
+            fn.forget_entity(username)
+            logger.info(f"Ошибка при обработке сущности {username}: {e}")
+            return
+
+    if synced:
+        synced_username, started = synced
+        _last_synced[synced_username] = started
+    pending_writes.update(channel_writes)
+
+
+async def _sync_channel(
+    channel: MonitoringChannel,
+    client: TelegramClient,
+    storage: RedisStorage,
+    session: AsyncSession,
+    state: dict[str, int | None],
+    pending_writes: dict[str, int],
+) -> tuple[str, float] | None:
+    """
+    Синхронизация канала. Возвращает имя и время начала опроса, если Telegram
+    был успешно опрошен; _last_synced обновляется только после коммита.
+    """
+    if channel.username.startswith("@") or channel.username.startswith("-"):
+        subscribed = await fn.Sub.subscribe_to_channel(
+            channel.username,
+            client,
+            storage,
+        )
+    else:
+        subscribed = await fn.Sub.subscribe_by_invite_hash(
+            channel.username,
+            client,
+            storage,
+        )
+        new_username = await fn.Sub.fetch_id_from_chat_invite_request(
+            channel.username,
+            client,
+        )
+        if new_username:
+            channel.username = new_username
+        else:
+            logger.info("Не удалось получить id канала, помечаю канал для удаления")
+            await session.delete(channel)
+            return None
+
+    if not subscribed:
+        logger.info(f"Не удалось подписаться/присоединиться к {channel.username}")
+        return None
+
+    entity = await fn.safe_get_entity(client, channel.username)
+    if not entity:
+        logger.info(f"Сущность не найдена: {channel.username}")
+        return None
+
+    # Приводим к Union-типу
+    chat_like: TypeChatLike = cast(TypeChatLike, entity)
+
+    # обновлеяем имя канала/чата если у него оно не указано еще
+    if not channel.title:
+        channel.title = chat_like.title
+
+    _peer_usernames[get_peer_id(chat_like)] = channel.username
+    if not _needs_sync(channel.username, state):
+        logger.debug(f"Нет новых событий в {channel.username}, пропускаем")
+        return None
+
+    started = time.monotonic()
+
+    # Определяем тип сущности
+    is_channel = getattr(chat_like, "broadcast", False)
+    is_megagroup = getattr(chat_like, "megagroup", False)
+
+    # Выбираем стратегию обработки
+    if is_channel and not is_megagroup:
+        # Это обычный канал (broadcast)
+        updates = await fn.get_difference_update_channel(
+            client=client,
+            storage=storage,
+            channel=chat_like,
+            channel_username=channel.username,
+            state=state,
+            pending_writes=pending_writes,
+        )
+    else:
+        # Это чат, супергруппа или мигрированная группа
+        updates = await fn.get_difference_update_chat(
+            client=client,
+            storage=storage,
+            chat=chat_like,
+            chat_username=channel.username,
+            state=state,
+            pending_writes=pending_writes,
+        )
+
+    if updates is None:
+        fn.forget_entity(channel.username)
+        raise RuntimeError(f"Не удалось получить обновления {channel.username}")
+
+    # Опрос удался: снимаем флаг событий вместе с остальными записями тика
+    synced = (channel.username, started)
+    if state.get(f"dirty:{channel.username}"):
+        pending_writes[f"dirty:{channel.username}"] = 0
+
+    if not updates:
+        logger.info(f"Нет новых сообщений в {channel.username}")
+        return synced
+
+    # Обработка новых сообщений
+    # Только текстовые сообщения: (message_id, текст)
+    candidates = [
+        (update.id, update.message)
+        for update in updates
+        if isinstance(update, Message) and (update.message or "").strip()
+    ]
+
+    if not candidates:
+        logger.info(f"Нет текстовых сообщений в {channel.username}")
+        return synced
+
+    # Проверка на дубликаты одним запросом. Уникальный индекс создаёт схема
+    # post_manager, и на существующих БД его может не быть, поэтому без этой
+    # проверки ON DUPLICATE KEY UPDATE дубликаты не остановит.
+    existing = set(
+        await session.scalars(
+            select(Post.message_id).where(
+                (Post.channel_username == channel.username)
+                & (Post.message_id.in_([message_id for message_id, _ in candidates]))
+            )
+        )
+    )
+    candidates = [
+        (message_id, msg_text)
+        for message_id, msg_text in candidates
+        if message_id not in existing
+    ]
+
+    if not candidates:
+        logger.info(f"Новых уникальных сообщений в {channel.username} нет.")
+        return synced
+
+    # Один многострочный INSERT. При наличии уникального индекса
+    # (channel_username, message_id) дубликаты из гонки между процессами
+    # отсекает сам MySQL.
+    stmt = mysql_insert(Post).values(
+        [
+            {
+                "message_id": message_id,
+                "channel_username": channel.username,
+                "content": msg_text,
+            }
+            for message_id, msg_text in candidates
+        ]
+    )
+    await session.execute(
+        stmt.on_duplicate_key_update(message_id=stmt.inserted.message_id)
+    )
+    # Число отправленных строк: при гонке с другим процессом часть из них
+    # может оказаться дубликатом и не записаться
+    logger.info(
+        f"Отправлено на запись {len(candidates)} новых сообщений из {channel.username}"
+    )
+    return synced
@@ -35,12 +35,15 @@ class Base(DeclarativeBase, AsyncAttrs):
 async def create_db_session_pool(
     se: Settings,
 ) -> tuple[AsyncEngine, async_sessionmaker[AsyncSession]]:
+    # Одновременно занято до CHANNELS_CONCURRENCY (background_jobs) сессий
+    # каналов плюс короткая сессия чтения порции каналов; пул берём с запасом.
+    # Соединения используются каждые 10 секунд, поэтому pre_ping не нужен.
     engine: AsyncEngine = create_async_engine(
         url=se.mysql_dsn(),
-        max_overflow=10,
-        pool_size=100,
-        pool_pre_ping=True,
-        pool_recycle=900,
+        max_overflow=16,
+        pool_size=16,
+        pool_pre_ping=False,
+        pool_recycle=1800,
     )
 
     return engine, async_sessionmaker(engine, expire_on_commit=False)
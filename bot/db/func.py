@@ -26,6 +26,40 @@ class RedisStorage:
         data = await self._redis.get(self.build_key(key))
         return self.decoder.decode(data) if data else None
 
+    async def get_int(self, key: Any) -> int | None:
+        """
+        Извлекает целое число (PTS, max_id), хранящееся в Redis как десятичная строка.
+
+        :param key: Ключ для извлечения данных.
+        :return: Число, или None если ключ не найден.
+        """
+        if not self._redis:
+            return None
+        data = await self._redis.get(self.build_key(key))
+        return int(data) if data else None
+
+    async def mget_int(self, keys: list[Any]) -> list[int | None]:
+        """
+        Извлекает несколько целых чисел из Redis одним запросом MGET.
+
+        :param keys: Ключи для извлечения данных.
+        :return: Числа в порядке ключей, None для отсутствующих.
+        """
+        if not self._redis or not keys:
+            return [None] * len(keys)
+        data = await self._redis.mget(list(map(self.build_key, keys)))
+        return [int(item) if item else None for item in data]
+
+    async def exists(self, key: Any) -> bool:
+        """
+        Проверяет наличие ключа в Redis (для флагов, значение не читается).
+
+        :param key: Ключ для проверки.
+        """
+        if not self._redis:
+            return False
+        return bool(await self._redis.exists(self.build_key(key)))
+
     async def set(self, key: Any, value: Any, **kwargs) -> None:
         """
         Сохраняет данные в Redis с использованием msgspec для сериализации.
@@ -36,5 +70,26 @@ class RedisStorage:
         serialized_data = self.encoder.encode(value)
         await self._redis.set(self.build_key(key), serialized_data, **kwargs)
 
+    async def set_int(self, key: Any, value: int, **kwargs) -> None:
+        """
+        Сохраняет целое число в Redis как десятичную строку, без сериализации.
+
+        :param key: Ключ для сохранения данных.
+        :param value: Число для сохранения.
+        """
+        await self._redis.set(self.build_key(key), value, **kwargs)
+
+    async def mset_int(self, mapping: dict[Any, int]) -> None:
+        """
+        Сохраняет несколько целых чисел в Redis одним pipeline-вызовом MSET.
+
+        :param mapping: Ключи и числа для сохранения.
+        """
+        if not mapping:
+            return
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.mset({self.build_key(key): value for key, value in mapping.items()})
+            await pipe.execute()
+
     async def delete(self, *keys: Any) -> None:
         await self._redis.delete(*map(self.build_key, keys))
@@ -2,6 +2,7 @@ from typing import List
 from sqlalchemy import (
     BigInteger,
     String,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 import datetime
@@ -13,6 +14,15 @@ from .base import Base
 
 class Post(Base):
     __tablename__ = "posts"
+    # Схемой БД владеет post_manager; до создания индекса там дубликаты
+    # отсекает проверка в background_jobs
+    __table_args__ = (
+        UniqueConstraint(
+            "channel_username",
+            "message_id",
+            name="uq_posts_channel_username_message_id",
+        ),
+    )
 
     message_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     channel_username: Mapped[str] = mapped_column(String(200), nullable=False)
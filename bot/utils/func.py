@@ -1,9 +1,12 @@
+import asyncio
 import logging
-from typing import Any, Union
+import time
+from collections.abc import AsyncIterator
+from typing import Any, Final, Union
 
 import telethon
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from telethon import TelegramClient
 from telethon.errors import (
     ChannelPrivateError,
@@ -52,23 +55,98 @@ logger = logging.getLogger(__name__)
 # Типы сущностей, которые мы можем отслеживать
 TypeChatLike = Union[Channel, Chat]
 
+# Кэш сущностей Telethon: peer_id -> (время получения, сущность, InputChannel)
+_ENTITY_TTL: Final[int] = 300
+_entity_cache: dict[Any, tuple[float, Entity, InputChannel | None]] = {}
+
+# Ограничение одновременных запросов к Telegram (защита от FloodWait)
+TELETHON_CONC = asyncio.Semaphore(6)
+
+# Ключи подписок, уже подтверждённых в этом процессе (зеркало флагов в Redis)
+_subscribed: set[str] = set()
+
 
 class Function:
+    @staticmethod
+    async def get_state(
+        storage: RedisStorage,
+        key: str,
+        state: dict[str, int | None] | None = None,
+    ) -> int | None:
+        """Берёт значение из заранее загруженного state, иначе читает из Redis."""
+        if state is not None and key in state:
+            return state[key]
+        return await storage.get_int(key)
+
+    @staticmethod
+    async def put_state(
+        storage: RedisStorage,
+        key: str,
+        value: int,
+        pending_writes: dict[str, int] | None = None,
+    ) -> None:
+        """Откладывает запись в pending_writes, если он передан, иначе пишет в Redis."""
+        if pending_writes is not None:
+            pending_writes[key] = value
+        else:
+            await storage.set_int(key, value)
+
+    @staticmethod
+    def state_keys(username: str) -> list[str]:
+        """Ключи Redis (PTS, max_id, флаг событий) для обработки канала/чата."""
+        return [username, f"chat_last_max_id:{username}", f"dirty:{username}"]
+
     @staticmethod
     async def get_channels(session: AsyncSession) -> list[MonitoringChannel]:
         logger.info("Загрузка идентификаторов каналов...")
         channels = (await session.scalars(select(MonitoringChannel))).all()
         return list(channels)
 
+    @staticmethod
+    async def iter_channels(
+        sessionmaker: async_sessionmaker[AsyncSession],
+        chunk_size: int = 200,
+    ) -> AsyncIterator[list[MonitoringChannel]]:
+        """
+        Читает каналы порциями по chunk_size, не загружая всю таблицу.
+        Каждая порция берётся по ключу (id > последнего) в своей короткой сессии,
+        поэтому курсор БД не остаётся открытым, пока порция обрабатывается.
+        Для небольших инсталляций достаточно get_channels.
+        """
+        logger.info("Загрузка идентификаторов каналов порциями...")
+        last_id = 0
+        while True:
+            async with sessionmaker() as session:
+                channels = list(
+                    await session.scalars(
+                        select(MonitoringChannel)
+                        .where(MonitoringChannel.id > last_id)
+                        .order_by(MonitoringChannel.id)
+                        .limit(chunk_size)
+                    )
+                )
+            if not channels:
+                return
+            # id читаем до yield: потребитель привязывает каналы к своим сессиям
+            last_id = channels[-1].id
+            yield channels
+            if len(channels) < chunk_size:
+                return
+
     @staticmethod
     async def safe_get_entity(
         client: TelegramClient,
         peer_id: Any,
     ) -> Entity | list[Entity] | None:
+        cached = _entity_cache.get(peer_id)
+        if cached and time.monotonic() - cached[0] < _ENTITY_TTL:
+            return cached[1]
+
         try:
             # Сначала пробуем получить пользователя напрямую
-            return await client.get_entity(peer_id)
+            entity = await client.get_entity(peer_id)
         except ValueError:
+            _entity_cache.pop(peer_id, None)
             logger.info(
                 f"Пользователь {peer_id} не найден в кэше, обновляем диалоги..."
             )
@@ -79,7 +157,7 @@ class Function:
                 await client.catch_up()
 
                 # Пробуем снова после обновления кэша
-                return await client.get_entity(peer_id)
+                entity = await client.get_entity(peer_id)
             except ValueError:
                 logger.info(
                     f"Пользователь {peer_id} всё ещё недоступен после обновления кэша"
@@ -89,14 +167,42 @@ class Function:
                 logger.info(f"Ошибка при получении пользователя {peer_id}: {e}")
                 return None
 
+        _entity_cache[peer_id] = (time.monotonic(), entity, None)  # pyright: ignore
+        return entity
+
+    @staticmethod
+    def forget_entity(peer_id: Any) -> None:
+        """Сбрасывает кэш сущности, например после неудачного запроса к ней."""
+        _entity_cache.pop(peer_id, None)
+
+    @staticmethod
+    def get_input_channel(peer_id: Any, channel: TypeChatLike) -> InputChannel:
+        """
+        InputChannel для канала; кэшируется вместе с сущностью и строится заново
+        только после её обновления в safe_get_entity.
+        """
+        cached = _entity_cache.get(peer_id)
+        if cached and cached[1] is channel and cached[2]:
+            return cached[2]
+
+        input_channel = InputChannel(channel.id, channel.access_hash)  # pyright: ignore
+        if cached and cached[1] is channel:
+            _entity_cache[peer_id] = (cached[0], channel, input_channel)
+        return input_channel
+
     @staticmethod
     async def get_difference_update_channel(
         client: TelegramClient,
         storage: RedisStorage,
         channel: TypeChatLike,
         channel_username: str,
-    ) -> list[TypeMessage]:
-        """Улучшенное получение обновлений для канала с максимальным охватом сообщений."""
+        state: dict[str, int | None] | None = None,
+        pending_writes: dict[str, int] | None = None,
+    ) -> list[TypeMessage] | None:
+        """
+        Улучшенное получение обновлений для канала с максимальным охватом сообщений.
+        Возвращает None, если запрос к Telegram не удался.
+        """
         try:
             if not channel:
                 return []
@@ -104,17 +210,18 @@ class Function:
             if not channel.access_hash:
                 return []
 
-            input_channel = InputChannel(channel.id, channel.access_hash)
-            chat_pts = await storage.get(channel_username)
+            input_channel = Function.get_input_channel(channel_username, channel)
+            chat_pts = await Function.get_state(storage, channel_username, state)
 
             # Инициализация PTS через GetFullChannelRequest при первом запуске
             if not chat_pts:
-                full_channel = await client(GetFullChannelRequest(input_channel))
+                async with TELETHON_CONC:
+                    full_channel = await client(GetFullChannelRequest(input_channel))
                 pts = full_channel.full_chat.pts  # pyright: ignore
-                await storage.set(channel_username, pts)
+                await Function.put_state(storage, channel_username, pts, pending_writes)
                 logger.info(f"Инициализирован PTS={pts} для канала {channel_username}")
             else:
-                pts = int(chat_pts)
+                pts = chat_pts
 
             # Запрос разницы БЕЗ фильтра (критически важно!)
             # Макс. значение для 32-bit signed int (Telegram использует 32-bit ID)
@@ -123,15 +230,16 @@ class Function:
                 ranges=[MessageRange(0, MAX_MESSAGE_ID)],
                 exclude_new_messages=False,
             )
-            difference: ChannelDifference = await client(  # pyright: ignore
-                GetChannelDifferenceRequest(
-                    channel=input_channel,
-                    filter=filter,
-                    pts=pts,
-                    limit=50,
-                    force=True,  # Гарантируем получение изменений
+            async with TELETHON_CONC:
+                difference: ChannelDifference = await client(  # pyright: ignore
+                    GetChannelDifferenceRequest(
+                        channel=input_channel,
+                        filter=filter,
+                        pts=pts,
+                        limit=100,  # Максимум для пользовательских аккаунтов
+                        force=True,  # Гарантируем получение изменений
+                    )
                 )
-            )
 
             # Обработка случаев
             if isinstance(difference, ChannelDifferenceEmpty):
@@ -149,22 +257,23 @@ class Function:
                     input_channel,
                     storage,
                     channel_username,
+                    pending_writes,
                 )
 
             # Сбор ВСЕХ сообщений (включая other_updates)
-            updates = difference.new_messages.copy()
-            if hasattr(difference, "other_updates") and difference.other_updates:
-                updates.extend(
-                    [  # pyright: ignore
-                        update.message  # pyright: ignore
-                        for update in difference.other_updates
-                        if hasattr(update, "message") and update.message  # pyright: ignore
-                    ]
-                )
+            updates = list(difference.new_messages)
+            other_updates = getattr(difference, "other_updates", None) or ()
+            updates.extend(
+                update.message  # pyright: ignore
+                for update in other_updates
+                if getattr(update, "message", None)
+            )
 
             # Обновление PTS только если есть изменения
             if difference.pts > pts:
-                await storage.set(channel_username, difference.pts)
+                await Function.put_state(
+                    storage, channel_username, difference.pts, pending_writes
+                )
                 logger.info(
                     f"Канал {channel_username}: получено {len(updates)} сообщений. PTS обновлен: {pts} → {difference.pts}"
                 )
@@ -179,7 +288,7 @@ class Function:
             logger.exception(
                 f"Критическая ошибка при обработке канала {channel_username}: {e}"
             )
-            return []
+            return None
 
     @staticmethod
     async def get_difference_update_chat(
@@ -187,11 +296,14 @@ class Function:
         storage: RedisStorage,
         chat: TypeChat,
         chat_username: str,
-    ) -> list[Message]:
+        state: dict[str, int | None] | None = None,
+        pending_writes: dict[str, int] | None = None,
+    ) -> list[Message] | None:
         """
         Получение новых сообщений из чата/группы с использованием эмуляции разностного обновления
         через хранение последнего известного max_id и поллинг истории.
         Подходит для групп и чатов, где нет ChannelDifference.
+        Возвращает None, если запрос к Telegram не удался.
         """
         try:
             if not chat:
@@ -215,22 +327,27 @@ class Function:
                 input_chat = InputPeerChannel(chat.id, chat.access_hash)
 
             # Получаем последний известный max_id (аналог PTS для чатов)
-            last_max_id_str = await storage.get(f"chat_last_max_id:{chat_username}")
-            last_max_id = int(last_max_id_str) if last_max_id_str else 0
+            last_max_id = (
+                await Function.get_state(
+                    storage, f"chat_last_max_id:{chat_username}", state
+                )
+                or 0
+            )
 
             # Получаем последние сообщения
-            messages = await client(
-                GetHistoryRequest(
-                    peer=input_chat,
-                    limit=50,  # Максимум за один запрос
-                    offset_date=None,
-                    offset_id=0,
-                    max_id=0,
-                    min_id=last_max_id,
-                    add_offset=0,
-                    hash=0,
+            async with TELETHON_CONC:
+                messages = await client(
+                    GetHistoryRequest(
+                        peer=input_chat,
+                        limit=100,  # Максимум за один запрос
+                        offset_date=None,
+                        offset_id=0,
+                        max_id=0,
+                        min_id=last_max_id,
+                        add_offset=0,
+                        hash=0,
+                    )
                 )
-            )
 
             new_messages = [
                 msg
@@ -244,7 +361,12 @@ class Function:
 
                 # Обновляем max_id
                 current_max_id = max(msg.id for msg in new_messages)
-                await storage.set(f"chat_last_max_id:{chat_username}", current_max_id)
+                await Function.put_state(
+                    storage,
+                    f"chat_last_max_id:{chat_username}",
+                    current_max_id,
+                    pending_writes,
+                )
                 logger.info(
                     f"Чат {chat_username}: получено {len(new_messages)} новых сообщений. "
                     f"max_id обновлён: {last_max_id} → {current_max_id}"
@@ -260,7 +382,7 @@ class Function:
             logger.exception(
                 f"Критическая ошибка при обработке чата {chat_username}: {e}"
             )
-            return []
+            return None
 
     @staticmethod
     async def _handle_too_long_state(
@@ -268,27 +390,32 @@ class Function:
         input_channel: InputChannel,
         storage: RedisStorage,
         channel_username: str,
-    ) -> list[Any]:
-        """Обработка устаревшего PTS через историю сообщений"""
+        pending_writes: dict[str, int] | None = None,
+    ) -> list[Any] | None:
+        """Обработка устаревшего PTS через историю сообщений (None при ошибке)"""
         try:
             # Получаем последние 100 сообщений (максимум за один запрос)
-            history: Messages = await client(
-                GetHistoryRequest(
-                    peer=input_channel,  # pyright: ignore
-                    limit=100,
-                    offset_date=None,
-                    offset_id=0,
-                    max_id=0,
-                    min_id=0,
-                    add_offset=0,
-                    hash=0,
+            async with TELETHON_CONC:
+                history: Messages = await client(
+                    GetHistoryRequest(
+                        peer=input_channel,  # pyright: ignore
+                        limit=100,
+                        offset_date=None,
+                        offset_id=0,
+                        max_id=0,
+                        min_id=0,
+                        add_offset=0,
+                        hash=0,
+                    )
                 )
-            )
 
             # Обновляем PTS до актуального
-            full_channel: ChatFull = await client(GetFullChannelRequest(input_channel))  # pyright: ignore
+            async with TELETHON_CONC:
+                full_channel: ChatFull = await client(  # pyright: ignore
+                    GetFullChannelRequest(input_channel)
+                )
             new_pts = full_channel.full_chat.pts  # pyright: ignore
-            await storage.set(channel_username, new_pts)
+            await Function.put_state(storage, channel_username, new_pts, pending_writes)
 
             logger.warning(
                 f"Канал {channel_username}: восстановлено {len(history.messages)} сообщений "
@@ -300,12 +427,34 @@ class Function:
             logger.error(
                 f"Ошибка при обработке ChannelDifferenceTooLong для {channel_username}: {e}"
             )
-            return []
+            return None
 
     class Sub:
         @staticmethod
-        async def is_subscribed(channel_username: str, client: TelegramClient) -> bool:
-            """Проверяет, подписан ли пользователь на канал."""
+        async def is_subscribed_cached(key: str, storage: RedisStorage) -> bool:
+            """Проверяет флаг подписки сначала в памяти процесса, затем в Redis."""
+            if key in _subscribed:
+                return True
+            if await storage.exists(key):
+                _subscribed.add(key)
+                return True
+            return False
+
+        @staticmethod
+        async def remember_subscription(key: str, storage: RedisStorage) -> None:
+            _subscribed.add(key)
+            await storage.set_int(key, 1)
+
+        @staticmethod
+        async def is_subscribed(
+            channel_username: str,
+            client: TelegramClient,
+        ) -> bool | None:
+            """
+            Проверяет, подписан ли пользователь на канал.
+            Возвращает None, если проверить не удалось (ошибка, отличная от
+            USER_NOT_PARTICIPANT).
+            """
             try:
                 await client(GetParticipantRequest(channel_username, "me"))  # pyright: ignore
                 return True
@@ -314,7 +463,7 @@ class Function:
                     return False
                 else:
                     print(f"Ошибка при проверке подписки на {channel_username}: {e}")
-                    return False
+                    return None
 
         @staticmethod
         async def subscribe_to_channel(
@@ -323,23 +472,32 @@ class Function:
             storage: RedisStorage,
         ) -> bool:
             """Подписывается на канал, если ещё не подписан."""
-            is_subscribed_cached = await storage.get(channel_username + ":subscribed")
-            if is_subscribed_cached:
+            key = channel_username + ":subscribed"
+            if await Function.Sub.is_subscribed_cached(key, storage):
                 return True
             try:
-                if await Function.Sub.is_subscribed(channel_username, client):
+                is_subscribed = await Function.Sub.is_subscribed(
+                    channel_username, client
+                )
+                if is_subscribed:
                     print(f"✅ Уже подписан на {channel_username}")
-                    await storage.set(channel_username + ":subscribed", True)
+                    await Function.Sub.remember_subscription(key, storage)
                     return True
+                if is_subscribed is None:
+                    # Не знаем точно — не тратим JoinChannelRequest впустую
+                    return False
 
                 await client(
                     telethon.functions.channels.JoinChannelRequest(channel_username)  # pyright: ignore
                 )
                 print(f"✅ Подписался на {channel_username}")
+                await Function.Sub.remember_subscription(key, storage)
                 return True
 
             except UserAlreadyParticipantError:
                 print(f"✅ Уже подписан на {channel_username}")
+                await Function.Sub.remember_subscription(key, storage)
+                return True
             except InviteHashExpiredError:
                 print(f"❌ Ссылка-приглашение устарела для {channel_username}")
             except ChannelPrivateError:
@@ -356,16 +514,16 @@ class Function:
             client: TelegramClient,
             storage: RedisStorage,
         ) -> bool:
-            is_subscribed_cached = await storage.get(invite_hash + ":subscribed")
-            if is_subscribed_cached:
+            key = invite_hash + ":subscribed"
+            if await Function.Sub.is_subscribed_cached(key, storage):
                 return True
             try:
                 result = await client(ImportChatInviteRequest(invite_hash))
                 print(f"Присоединились по invite-ссылке: {invite_hash}")
-                await storage.set(invite_hash + ":subscribed", True)
+                await Function.Sub.remember_subscription(key, storage)
                 return True
             except UserAlreadyParticipantError:
-                await storage.set(invite_hash + ":subscribed", True)
+                await Function.Sub.remember_subscription(key, storage)
                 print(f"✅ Уже подписан по ссылке {invite_hash}")
                 return True
             except Exception as e: